@@ -15,9 +15,18 @@ ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg:/
 # Create async engine
 engine = create_async_engine(
     ASYNC_DATABASE_URL,
-    echo=True,  # Set to False in production
+    echo=bool(os.getenv("SQL_DEBUG")),  # Statement logging is synchronous, keep it opt-in
     pool_size=20,
-    max_overflow=0
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    connect_args={
+        # Keep idle connections alive through load balancer / NAT timeouts
+        "server_settings": {
+            "tcp_keepalives_idle": "30",
+            "tcp_keepalives_interval": "10"
+        }
+    }
 )
 
 # Create session maker
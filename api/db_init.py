@@ -3,6 +3,10 @@ import os
 import asyncpg
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ops", "db")
+SCHEMA_PATH = os.path.join(SCHEMA_DIR, "init.sql")
+# Idempotent statements applied after init.sql, on new and existing databases
+INDEXES_PATH = os.path.join(SCHEMA_DIR, "init_indexes.sql")
 
 async def create_tables():
     """Create database tables and extensions"""
@@ -14,16 +18,19 @@ async def create_tables():
         await conn.execute("CREATE EXTENSION IF NOT EXISTS vector;")
         await conn.execute("CREATE EXTENSION IF NOT EXISTS \"uuid-ossp\";")
         
-        # Execute schema
-        with open('../ops/db/init.sql', 'r') as f:
+        # Execute schema as a single multi-statement batch
+        with open(SCHEMA_PATH, 'r') as f:
             schema = f.read()
-            # Split by individual statements and execute
-            statements = schema.split(';')
-            for statement in statements:
-                if statement.strip():
-                    await conn.execute(statement + ';')
+        try:
+            async with conn.transaction():
+                await conn.execute(schema)
+            print("Database tables created successfully!")
+        except asyncpg.DuplicateTableError:
+            print("Database tables already exist, skipping init.sql")
         
-        print("Database tables created successfully!")
+        with open(INDEXES_PATH, 'r') as f:
+            await conn.execute(f.read())
+        print("Database indexes are up to date")
         
     except Exception as e:
         print(f"Error creating tables: {e}")
@@ -1,27 +1,82 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks, status
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
-import asyncio
 import os
 import uuid
-import json
+import orjson
+import logging
 from datetime import datetime
+from functools import lru_cache
 
-# Use proper package imports
-import importlib.util
-import os
+# The ingest package is resolved from the repo root (see PYTHONPATH in start.sh)
+from ingest.reddit_connector import RedditConnector
+from redis_client import redis
 
-# Load the ingest module dynamically (better than sys.path manipulation)
-ingest_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ingest", "reddit_connector.py")
-spec = importlib.util.spec_from_file_location("reddit_connector", ingest_path)
-reddit_module = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(reddit_module)
-RedditConnector = reddit_module.RedditConnector
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ingest", tags=["ingestion"])
 
-# In-memory job tracking (in production, use Redis or database)
-active_jobs = {}
+@lru_cache(maxsize=1)
+def get_connector() -> RedditConnector:
+    """Shared connector, so the Reddit session and DB pool are reused across requests"""
+    return RedditConnector()
+
+# Job tracking in Redis: one hash per job plus a capped list of recent job ids
+JOB_TTL_SECONDS = 86400
+MAX_TRACKED_JOBS = 1000
+REDDIT_JOBS_KEY = "jobs:reddit"
+NULLABLE_JOB_FIELDS = ("progress", "completed_at")
+
+# HSET only if the job hash still exists; a bare HSET on an expired or evicted
+# job would recreate it without a TTL or started_at
+_UPDATE_JOB_SCRIPT = redis.register_script("""
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('HSET', KEYS[1], unpack(ARGV))
+end
+return -1
+""")
+
+def job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+def serialize_job(data: Dict[str, Any]) -> Dict[str, str]:
+    """Flatten job fields into Redis hash values"""
+    fields = {}
+    for key, value in data.items():
+        if value is None:
+            fields[key] = ""
+        elif isinstance(value, datetime):
+            fields[key] = value.isoformat()
+        elif isinstance(value, dict):
+            fields[key] = orjson.dumps(value).decode()
+        else:
+            fields[key] = str(value)
+    return fields
+
+def deserialize_job(fields: Dict[str, str]) -> Dict[str, Any]:
+    """Restore job fields read from a Redis hash"""
+    job = dict(fields)
+    for key in NULLABLE_JOB_FIELDS:
+        if not job.get(key):
+            job[key] = None
+    if job["progress"]:
+        job["progress"] = orjson.loads(job["progress"])
+    job["mentions_count"] = int(job.get("mentions_count") or 0)
+    return job
+
+async def create_job(job_id: str, data: Dict[str, Any]):
+    """Store a new job and push it onto the recent jobs list"""
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(job_key(job_id), mapping=serialize_job(data))
+        pipe.expire(job_key(job_id), JOB_TTL_SECONDS)
+        pipe.lpush(REDDIT_JOBS_KEY, job_id)
+        pipe.ltrim(REDDIT_JOBS_KEY, 0, MAX_TRACKED_JOBS - 1)
+        await pipe.execute()
+
+async def update_job(job_id: str, data: Dict[str, Any]) -> bool:
+    """Update fields of an existing job; returns False if the job has expired"""
+    args = [item for pair in serialize_job(data).items() for item in pair]
+    return await _UPDATE_JOB_SCRIPT(keys=[job_key(job_id)], args=args) != -1
 
 class IngestionJobStatus(BaseModel):
     job_id: str
@@ -46,26 +101,21 @@ class RedditIngestionRequest(BaseModel):
 async def run_reddit_ingestion(job_id: str, request: RedditIngestionRequest):
     """Background task to run Reddit ingestion"""
     try:
-        active_jobs[job_id]["status"] = "running"
-        active_jobs[job_id]["message"] = "Starting Reddit ingestion..."
-        
-        connector = RedditConnector()
+        await update_job(job_id, {
+            "status": "running",
+            "message": "Starting Reddit ingestion..."
+        })
         
-        # Override subreddits if provided
-        if request.subreddits:
-            connector.subreddits = request.subreddits
-            
-        # Run ingestion (PRAW operations are synchronous, so we run in executor)
-        import concurrent.futures
-        loop = asyncio.get_event_loop()
+        connector = get_connector()
         
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            mentions_count = await loop.run_in_executor(
-                executor, 
-                lambda: asyncio.run(connector.ingest_all_subreddits(request.limit_per_subreddit))
-            )
+        # Async PRAW runs on the API's own event loop; requested subreddits
+        # override the defaults for this run only
+        mentions_count = await connector.ingest_all_subreddits(
+            request.limit_per_subreddit,
+            subreddits=request.subreddits
+        )
         
-        active_jobs[job_id].update({
+        await update_job(job_id, {
             "status": "completed",
             "mentions_count": mentions_count,
             "message": f"Successfully ingested {mentions_count} mentions from Reddit",
@@ -73,11 +123,15 @@ async def run_reddit_ingestion(job_id: str, request: RedditIngestionRequest):
         })
         
     except Exception as e:
-        active_jobs[job_id].update({
-            "status": "failed",
-            "message": f"Reddit ingestion failed: {str(e)}",
-            "completed_at": datetime.utcnow()
-        })
+        try:
+            await update_job(job_id, {
+                "status": "failed",
+                "message": f"Reddit ingestion failed: {str(e)}",
+                "completed_at": datetime.utcnow()
+            })
+        except Exception as redis_error:
+            # Nothing else reports on a background task, so log both errors
+            logger.error(f"Reddit ingestion job {job_id} failed ({e}) and its status could not be saved: {redis_error}")
 
 @router.post("/reddit", status_code=status.HTTP_202_ACCEPTED)
 async def ingest_reddit_data(request: RedditIngestionRequest, background_tasks: BackgroundTasks):
@@ -86,7 +140,7 @@ async def ingest_reddit_data(request: RedditIngestionRequest, background_tasks:
         job_id = str(uuid.uuid4())
         
         # Initialize job status
-        active_jobs[job_id] = {
+        await create_job(job_id, {
             "job_id": job_id,
             "source": "reddit",
             "status": "queued",
@@ -95,7 +149,7 @@ async def ingest_reddit_data(request: RedditIngestionRequest, background_tasks:
             "message": "Job queued for processing",
             "started_at": datetime.utcnow(),
             "completed_at": None
-        }
+        })
         
         # Add background task
         background_tasks.add_task(run_reddit_ingestion, job_id, request)
@@ -112,29 +166,36 @@ async def ingest_reddit_data(request: RedditIngestionRequest, background_tasks:
 @router.get("/reddit/jobs/{job_id}", response_model=IngestionJobStatus)
 async def get_reddit_job_status(job_id: str):
     """Get status of a specific Reddit ingestion job"""
-    if job_id not in active_jobs:
+    job_data = await redis.hgetall(job_key(job_id))
+    if not job_data:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job_data = active_jobs[job_id]
-    return IngestionJobStatus(**job_data)
+    return IngestionJobStatus(**deserialize_job(job_data))
 
 @router.get("/reddit/jobs")
 async def list_reddit_jobs(limit: int = 10):
     """List recent Reddit ingestion jobs"""
-    jobs = list(active_jobs.values())[-limit:]
+    job_ids = await redis.lrange(REDDIT_JOBS_KEY, 0, limit - 1)
+    
+    async with redis.pipeline(transaction=False) as pipe:
+        for job_id in job_ids:
+            pipe.hgetall(job_key(job_id))
+        results = await pipe.execute()
+    
+    # Skip jobs whose hash has already expired
+    jobs = [deserialize_job(fields) for fields in results if fields]
     return {"jobs": jobs, "total": len(jobs)}
 
 @router.get("/reddit/status", response_model=Dict[str, Any])
 async def get_reddit_status():
     """Get Reddit connector status and configuration"""
     try:
-        connector = RedditConnector()
+        connector = get_connector()
         
         # Test Reddit API connectivity
         try:
             # Try to access a small subreddit to test API
-            test_sub = connector.reddit.subreddit("test")
-            test_sub.display_name  # This will trigger an API call
+            await connector.reddit.subreddit("test", fetch=True)  # This will trigger an API call
             api_status = "connected"
         except Exception as e:
             api_status = f"error: {str(e)}"
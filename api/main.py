@@ -1,7 +1,8 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from sqlalchemy import text
+from contextlib import asynccontextmanager
 import os
 from datetime import datetime
 from typing import List, Optional
@@ -12,13 +13,24 @@ import uvicorn
 from database import get_db_session
 from models import Narrative, Mention, NarrativeWindowStats
 from schemas import NarrativeResponse, TopNarrativesResponse, HealthResponse
-from ingestion_routes import router as ingestion_router
+from ingestion_routes import router as ingestion_router, get_connector
+from redis_client import close_redis
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Release shared clients on shutdown"""
+    yield
+    if get_connector.cache_info().currsize:
+        await get_connector().close()
+    await close_redis()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Solana Narrative Scanner API",
     description="API for scanning social platforms and tracking emerging narratives",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -85,14 +97,30 @@ async def get_narrative_details(narrative_id: int):
 async def get_mentions(
     narrative_id: Optional[int] = None,
     since: Optional[datetime] = None,
-    limit: int = 100,
+    before: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
     source: Optional[str] = None
 ):
-    """Get mentions, optionally filtered by narrative and time"""
+    """Get mentions, optionally filtered by narrative and time.
+    
+    Pass the previous page's next_before and next_before_id as before and
+    before_id to fetch the next page. before_id is only valid with before.
+    """
+    if before_id is not None and before is None:
+        raise HTTPException(status_code=422, detail="before_id requires before")
+    
     try:
         async with get_db_session() as db:
-            # Build query with SQLAlchemy text() bind parameters
-            query = "SELECT * FROM mention WHERE 1=1"
+            # Build query with SQLAlchemy text() bind parameters; text is
+            # truncated in Postgres so full bodies never leave the database
+            query = """
+                SELECT id, source, source_id, author,
+                       CASE WHEN length(text) > 200 THEN LEFT(text, 200) || '...'
+                            ELSE text END AS text,
+                       url, created_at, metrics, entities
+                FROM mention WHERE 1=1
+            """
             params = {}
             
             if source:
@@ -102,12 +130,22 @@ async def get_mentions(
             if since:
                 query += " AND created_at >= :since"
                 params["since"] = since
+            
+            # Keyset pagination: resume strictly before the last row seen.
+            # id breaks ties between rows sharing a created_at second
+            if before and before_id is not None:
+                query += " AND (created_at, id) < (:before, :before_id)"
+                params["before"] = before
+                params["before_id"] = before_id
+            elif before:
+                query += " AND created_at < :before"
+                params["before"] = before
                 
-            query += " ORDER BY created_at DESC LIMIT :limit"
+            query += " ORDER BY created_at DESC, id DESC LIMIT :limit"
             params["limit"] = limit
             
             result = await db.execute(text(query), params)
-            rows = result.fetchall()
+            rows = result.mappings().all()
             
             mentions = []
             for row in rows:
@@ -116,18 +154,21 @@ async def get_mentions(
                     "source": row["source"],
                     "source_id": row["source_id"],
                     "author": row["author"],
-                    "text": row["text"][:200] + "..." if row["text"] and len(row["text"]) > 200 else row["text"],
+                    "text": row["text"],
                     "url": row["url"],
                     "created_at": row["created_at"].isoformat(),
                     "metrics": row["metrics"],
                     "entities": row["entities"]
                 })
             
+            has_more = len(mentions) == limit
             return {
                 "mentions": mentions,
                 "total_count": len(mentions),
                 "source_filter": source,
-                "limit": limit
+                "limit": limit,
+                "next_before": mentions[-1]["created_at"] if has_more else None,
+                "next_before_id": mentions[-1]["id"] if has_more else None
             }
             
     except Exception as e:
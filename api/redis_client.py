@@ -0,0 +1,12 @@
+import os
+import redis.asyncio as aioredis
+
+# Redis configuration
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+# Create async client (connections are opened lazily from its pool)
+redis = aioredis.from_url(REDIS_URL, decode_responses=True)
+
+async def close_redis():
+    """Close Redis connection pool"""
+    await redis.aclose()
@@ -1,34 +1,105 @@
 import os
 import asyncio
 import asyncpg
-import praw
+import asyncpraw
+import redis.asyncio as aioredis
 from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional
-import json
+import orjson
 import logging
-from dataclasses import dataclass
+import re
+from dataclasses import dataclass, field
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
+# UTC tzinfo, bound once for the per-row timestamp conversions
+_UTC = timezone.utc
+
+# Column order of buffered mention rows, shared by COPY and the merge INSERT
+MENTION_COLUMNS = ["source", "source_id", "author", "text", "url", "created_at", "metrics", "lang", "entities"]
+
+# Maximum number of subreddits fetched at the same time
+MAX_CONCURRENT_SUBREDDITS = 4
+
+# Number of top comments ingested per submission
+TOP_COMMENTS_PER_SUBMISSION = 10
+
+# Maximum number of comment trees fetched at the same time per subreddit
+MAX_CONCURRENT_COMMENT_FETCHES = 8
+
+# Seconds between merges of mention_stage into mention during ingestion
+STAGE_MERGE_INTERVAL = 5
+
+# Unlogged staging table that ingest COPYs into; rows are merged into mention
+# in batches, so bulk loads skip WAL (staged rows are lost on crash). It holds
+# only MENTION_COLUMNS so staging never draws ids from mention_id_seq. The
+# connector creates it when it opens its pool, so existing databases get it too
+MENTION_STAGE_DDL = """
+    CREATE UNLOGGED TABLE IF NOT EXISTS mention_stage (
+        source TEXT,
+        source_id TEXT,
+        author TEXT,
+        text TEXT,
+        url TEXT,
+        created_at TIMESTAMPTZ,
+        metrics JSONB,
+        lang TEXT,
+        entities JSONB
+    )
+"""
+
+# Redis set of "source:source_id" keys already merged into mention; it expires
+# a day after creation so the set cannot grow forever. Keys are added only once
+# the merge has committed, so rows lost from the unlogged stage table (crash,
+# failed merge) are not suppressed and the next run stages them again
+SEEN_MENTIONS_KEY = "reddit:seen"
+SEEN_MENTIONS_TTL_SECONDS = 86400
+
+# Entity pattern, compiled once; each named group is the entities bucket it
+# fills, so one scan over the raw text finds every entity class. Unlike the old
+# whitespace split, a ticker may start mid-word (foo$BAR) and stops at any
+# non-letter ($SOL's -> SOL), and a $ inside a URL is consumed by the URL
+_ENTITY_RE = re.compile(
+    r'\$(?P<tickers>[A-Za-z]{1,10})\b'                # Ticker symbols (e.g., $SOL, $WIF)
+    r'|(?:^|(?<=\s))u/(?P<mentions>[A-Za-z0-9_-]+)'   # User mentions (e.g., u/someone)
+    r'|(?P<urls>https?://\S+)'                        # URLs
+)
+
+def _encode_jsonb(value: Any) -> bytes:
+    """Encode a Python object as binary JSONB (version byte + JSON text)"""
+    return b"\x01" + orjson.dumps(value)
+
+def _decode_jsonb(data: bytes) -> Any:
+    """Decode binary JSONB, skipping the version byte"""
+    return orjson.loads(data[1:])
+
+async def init_connection(conn):
+    """Register a binary JSONB codec so dicts can be passed straight through,
+    including in COPY, which only accepts binary-format codecs"""
+    await conn.set_type_codec(
+        "jsonb",
+        encoder=_encode_jsonb,
+        decoder=_decode_jsonb,
+        schema="pg_catalog",
+        format="binary"
+    )
+
+@dataclass(slots=True, frozen=True)
 class RedditMention:
     source: str = "reddit"
     source_id: str = ""
     author: Optional[str] = None
     text: Optional[str] = None
     url: Optional[str] = None
-    created_at: datetime = None
-    metrics: Dict[str, Any] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(_UTC))
+    metrics: Dict[str, Any] = field(default_factory=dict)
     lang: str = "en"
-    entities: Dict[str, Any] = None
+    entities: Dict[str, Any] = field(default_factory=dict)
     
-    def __post_init__(self):
-        if self.metrics is None:
-            self.metrics = {}
-        if self.entities is None:
-            self.entities = {}
+    @classmethod
+    def from_row(cls, row: tuple) -> "RedditMention":
+        """Build a mention from a row tuple in MENTION_COLUMNS order"""
+        return cls(*row)
 
 class RedditConnector:
     """Reddit connector for ingesting posts and comments from crypto/meme subreddits"""
@@ -36,7 +107,7 @@ class RedditConnector:
     def __init__(self):
         # Only initialize Reddit client if credentials are available
         if os.getenv("REDDIT_CLIENT_ID"):
-            self.reddit = praw.Reddit(
+            self.reddit = asyncpraw.Reddit(
                 client_id=os.getenv("REDDIT_CLIENT_ID"),
                 client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
                 user_agent=os.getenv("REDDIT_USER_AGENT", "NarrativeScanner/1.0")
@@ -44,6 +115,14 @@ class RedditConnector:
         else:
             self.reddit = None
         self.db_url = os.getenv("DATABASE_URL")
+        # Connection pool shared by all ingestion runs, created on first use
+        self.pool = None
+        self._pool_lock = asyncio.Lock()
+        # Optional Redis dedup cache in front of Postgres
+        if os.getenv("REDIS_URL"):
+            self.redis = aioredis.from_url(os.getenv("REDIS_URL"), decode_responses=True)
+        else:
+            self.redis = None
         
         # Target subreddits for crypto and meme content
         self.subreddits = [
@@ -59,152 +138,272 @@ class RedditConnector:
             "shitcoin"
         ]
         
-    async def connect_db(self):
-        """Establish database connection"""
-        return await asyncpg.connect(self.db_url)
+    async def get_pool(self):
+        """Return the database connection pool, creating it on first use"""
+        async with self._pool_lock:
+            if self.pool is None:
+                pool = await asyncpg.create_pool(
+                    self.db_url,
+                    min_size=2,
+                    max_size=10,
+                    command_timeout=30,
+                    init=init_connection
+                )
+                try:
+                    await pool.execute(MENTION_STAGE_DDL)
+                except Exception:
+                    await pool.close()
+                    raise
+                self.pool = pool
+        return self.pool
+    
+    async def close(self):
+        """Close the database pool, Redis client and the Reddit HTTP session"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+        if self.redis is not None:
+            await self.redis.aclose()
+        if self.reddit is not None:
+            await self.reddit.close()
     
-    def extract_entities(self, text: str) -> Dict[str, Any]:
+    async def filter_unseen(self, rows: list) -> list:
+        """Drop rows already recorded in the Redis seen set"""
+        if self.redis is None or not rows:
+            return rows
+        
+        try:
+            # One SMISMEMBER round-trip checks the whole batch
+            seen = await self.redis.smismember(
+                SEEN_MENTIONS_KEY, [f"{row[0]}:{row[1]}" for row in rows]
+            )
+        except Exception as e:
+            # Postgres still rejects duplicates via ON CONFLICT
+            logger.warning(f"Redis dedup unavailable, staging all rows: {e}")
+            return rows
+        
+        return [row for row, is_seen in zip(rows, seen) if not is_seen]
+    
+    async def mark_seen(self, keys: list):
+        """Record merged "source:source_id" keys in the Redis seen set"""
+        if self.redis is None or not keys:
+            return
+        
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.sadd(SEEN_MENTIONS_KEY, *keys)
+                pipe.expire(SEEN_MENTIONS_KEY, SEEN_MENTIONS_TTL_SECONDS, nx=True)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error recording seen mentions: {e}")
+    
+    def extract_entities(self, text: Optional[str]) -> Dict[str, List[str]]:
         """Extract entities from Reddit text"""
-        entities = {
-            "hashtags": [],
-            "tickers": [],
-            "urls": [],
-            "mentions": []
-        }
-        
-        if not text:
-            return entities
-            
-        words = text.split()
-        for word in words:
-            # Extract ticker symbols (e.g., $SOL, $WIF)
-            if word.startswith("$") and len(word) > 1:
-                ticker = word[1:].upper().strip(".,!?")
-                if ticker.isalpha() and len(ticker) <= 10:
-                    entities["tickers"].append(ticker)
-            
-            # Extract URLs
-            if word.startswith(("http://", "https://")):
-                entities["urls"].append(word)
-            
-            # Extract user mentions
-            if word.startswith("u/") and len(word) > 2:
-                entities["mentions"].append(word[2:])
-                
+        # Cheap substring checks skip the regex scans for entity-free text
+        if not text or ('$' not in text and 'http' not in text and 'u/' not in text):
+            return {"hashtags": [], "tickers": [], "urls": [], "mentions": []}
+        
+        entities: Dict[str, List[str]] = {"hashtags": [], "tickers": [], "urls": [], "mentions": []}
+        for match in _ENTITY_RE.finditer(text):
+            kind = match.lastgroup
+            value = match.group(kind)
+            entities[kind].append(value.upper() if kind == "tickers" else value)
         return entities
     
-    def process_submission(self, submission) -> RedditMention:
-        """Process a Reddit submission into our format"""
+    def process_submission(self, submission) -> tuple:
+        """Process a Reddit submission into a mention row (MENTION_COLUMNS order)"""
         # Combine title and selftext for full content
         text = submission.title
         if hasattr(submission, 'selftext') and submission.selftext:
             text += " " + submission.selftext
             
-        mention = RedditMention(
-            source_id=f"submission_{submission.id}",
-            author=str(submission.author) if submission.author else None,
-            text=text,
-            url=f"https://reddit.com{submission.permalink}",
-            created_at=datetime.fromtimestamp(submission.created_utc, tz=timezone.utc),
-            metrics={
+        return (
+            "reddit",
+            f"submission_{submission.id}",
+            str(submission.author) if submission.author else None,
+            text,
+            f"https://reddit.com{submission.permalink}",
+            datetime.fromtimestamp(submission.created_utc, tz=_UTC),
+            {
                 "score": submission.score,
                 "upvote_ratio": getattr(submission, 'upvote_ratio', None),
                 "num_comments": submission.num_comments,
                 "gilded": getattr(submission, 'gilded', 0),
                 "subreddit": str(submission.subreddit)
             },
-            entities=self.extract_entities(text)
+            "en",
+            self.extract_entities(text)
         )
-        
-        return mention
     
-    def process_comment(self, comment) -> RedditMention:
-        """Process a Reddit comment into our format"""
-        mention = RedditMention(
-            source_id=f"comment_{comment.id}",
-            author=str(comment.author) if comment.author else None,
-            text=comment.body,
-            url=f"https://reddit.com{comment.permalink}",
-            created_at=datetime.fromtimestamp(comment.created_utc, tz=timezone.utc),
-            metrics={
+    def process_comment(self, comment) -> tuple:
+        """Process a Reddit comment into a mention row (MENTION_COLUMNS order)"""
+        return (
+            "reddit",
+            f"comment_{comment.id}",
+            str(comment.author) if comment.author else None,
+            comment.body,
+            f"https://reddit.com{comment.permalink}",
+            datetime.fromtimestamp(comment.created_utc, tz=_UTC),
+            {
                 "score": comment.score,
                 "gilded": getattr(comment, 'gilded', 0),
                 "is_submitter": getattr(comment, 'is_submitter', False),
                 "subreddit": str(comment.subreddit)
             },
-            entities=self.extract_entities(comment.body)
+            "en",
+            self.extract_entities(comment.body)
         )
+    
+    async def flush_mentions(self, conn, buffer: list) -> bool:
+        """COPY buffered mentions into the unlogged mention_stage table.
         
-        return mention
+        Returns False if the rows could not be staged.
+        """
+        if not buffer:
+            return True
+        
+        try:
+            async with conn.transaction():
+                # Staged rows are disposable until merged, so skip the WAL flush wait
+                await conn.execute("SET LOCAL synchronous_commit = off")
+                await conn.copy_records_to_table(
+                    "mention_stage", records=buffer, columns=MENTION_COLUMNS
+                )
+            logger.debug(f"Flushed {len(buffer)} mentions")
+            return True
+        except Exception as e:
+            logger.error(f"Error flushing {len(buffer)} mentions: {e}")
+            return False
+        finally:
+            buffer.clear()
     
-    async def save_mention(self, conn, mention: RedditMention):
-        """Save mention to database with conflict handling"""
+    async def merge_staged_mentions(self):
+        """Move staged rows into mention, skipping ones already stored.
+        
+        Every moved row is durable in mention once the statement commits, so
+        only then are their keys added to the Redis seen set.
+        """
+        columns = ", ".join(MENTION_COLUMNS)
         try:
-            await conn.execute("""
-                INSERT INTO mention (source, source_id, author, text, url, created_at, metrics, lang, entities)
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                ON CONFLICT (source, source_id) DO NOTHING
-            """, 
-            mention.source,
-            mention.source_id, 
-            mention.author,
-            mention.text,
-            mention.url,
-            mention.created_at,
-            json.dumps(mention.metrics),
-            mention.lang,
-            json.dumps(mention.entities)
-            )
-            logger.debug(f"Saved mention: {mention.source_id}")
+            pool = await self.get_pool()
+            async with pool.acquire() as conn:
+                # DELETE ... RETURNING only takes rows that exist when the
+                # statement starts, so rows staged meanwhile wait for the next merge
+                moved = await conn.fetch(f"""
+                    WITH moved AS (
+                        DELETE FROM mention_stage RETURNING {columns}
+                    ), inserted AS (
+                        INSERT INTO mention ({columns})
+                        SELECT {columns} FROM moved
+                        ON CONFLICT (source, source_id) DO NOTHING
+                    )
+                    SELECT source, source_id FROM moved
+                """)
+            logger.debug(f"Merged {len(moved)} staged mentions")
         except Exception as e:
-            logger.error(f"Error saving mention {mention.source_id}: {e}")
+            logger.error(f"Error merging staged mentions: {e}")
+            return
+        
+        await self.mark_seen([f"{row['source']}:{row['source_id']}" for row in moved])
+    
+    async def merge_staged_mentions_periodically(self):
+        """Merge staged mentions every STAGE_MERGE_INTERVAL seconds until cancelled"""
+        while True:
+            await asyncio.sleep(STAGE_MERGE_INTERVAL)
+            await self.merge_staged_mentions()
+    
+    async def fetch_top_comments(self, submission) -> list:
+        """Fetch a submission's top comments as mention rows"""
+        # Only request as many comments as we keep instead of flattening the
+        # whole comment tree
+        submission.comment_sort = "top"
+        submission.comment_limit = TOP_COMMENTS_PER_SUBMISSION
+        await submission.load()
+        
+        rows = []
+        for comment in submission.comments.list()[:TOP_COMMENTS_PER_SUBMISSION]:
+            # "More comments" stubs have no body
+            if hasattr(comment, 'body') and comment.body not in ['[deleted]', '[removed]']:
+                rows.append(self.process_comment(comment))
+        return rows
     
     async def ingest_subreddit_posts(self, subreddit_name: str, limit: int = 100):
         """Ingest recent posts from a specific subreddit"""
         logger.info(f"Ingesting posts from r/{subreddit_name}")
         
-        conn = await self.connect_db()
-        mentions_saved = 0
+        # Rows waiting for the COPY flush, scoped per call so concurrent
+        # subreddit tasks never interleave rows
+        buffer = []
         
         try:
-            subreddit = self.reddit.subreddit(subreddit_name)
+            subreddit = await self.reddit.subreddit(subreddit_name)
             
             # Get hot posts
-            for submission in subreddit.hot(limit=limit):
-                mention = self.process_submission(submission)
-                await self.save_mention(conn, mention)
-                mentions_saved += 1
-                
-                # Also get top comments from this submission
-                submission.comments.replace_more(limit=0)  # Remove "more comments"
-                for comment in submission.comments.list()[:10]:  # Top 10 comments
-                    if hasattr(comment, 'body') and comment.body not in ['[deleted]', '[removed]']:
-                        comment_mention = self.process_comment(comment)
-                        await self.save_mention(conn, comment_mention)
-                        mentions_saved += 1
+            submissions = []
+            async for submission in subreddit.hot(limit=limit):
+                buffer.append(self.process_submission(submission))
+                submissions.append(submission)
+            
+            # Also get top comments from these submissions, fetching the
+            # comment trees concurrently rather than one after another
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_COMMENT_FETCHES)
+            
+            async def fetch_comments(submission) -> list:
+                async with semaphore:
+                    return await self.fetch_top_comments(submission)
+            
+            results = await asyncio.gather(
+                *[fetch_comments(s) for s in submissions], return_exceptions=True
+            )
+            for submission, rows in zip(submissions, results):
+                # gather returns CancelledError too, which is a BaseException
+                if isinstance(rows, BaseException):
+                    logger.error(f"Error fetching comments for {submission.id}: {rows}")
+                    continue
+                buffer.extend(rows)
                         
         except Exception as e:
             logger.error(f"Error ingesting r/{subreddit_name}: {e}")
         finally:
-            await conn.close()
+            # Flush whatever was collected, even after a partial fetch; rows
+            # merged by an earlier run never reach Postgres
+            rows = await self.filter_unseen(buffer)
+            try:
+                pool = await self.get_pool()
+                async with pool.acquire() as conn:
+                    staged = await self.flush_mentions(conn, list(rows))
+            except Exception as e:
+                logger.error(f"Error acquiring connection for r/{subreddit_name}: {e}")
+                staged = False
+            mentions_saved = len(rows) if staged else 0
             
         logger.info(f"Saved {mentions_saved} mentions from r/{subreddit_name}")
         return mentions_saved
     
-    async def ingest_all_subreddits(self, limit_per_subreddit: int = 50):
-        """Ingest posts from all configured subreddits"""
+    async def ingest_all_subreddits(self, limit_per_subreddit: int = 50, subreddits: Optional[List[str]] = None):
+        """Ingest posts from the given subreddits (default: all configured) concurrently"""
         logger.info("Starting Reddit ingestion for all subreddits")
-        total_mentions = 0
         
-        for subreddit_name in self.subreddits:
-            try:
-                count = await self.ingest_subreddit_posts(subreddit_name, limit_per_subreddit)
-                total_mentions += count
-                # Small delay to be respectful to Reddit's API
-                await asyncio.sleep(1)
-            except Exception as e:
-                logger.error(f"Failed to ingest r/{subreddit_name}: {e}")
-                continue
+        # Cap in-flight subreddit fetches to respect Reddit's rate limits;
+        # this replaces the fixed delay between subreddits
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_SUBREDDITS)
+        
+        async def ingest_one(subreddit_name: str) -> int:
+            async with semaphore:
+                try:
+                    return await self.ingest_subreddit_posts(subreddit_name, limit_per_subreddit)
+                except Exception as e:
+                    logger.error(f"Failed to ingest r/{subreddit_name}: {e}")
+                    return 0
+        
+        merger = asyncio.create_task(self.merge_staged_mentions_periodically())
+        try:
+            counts = await asyncio.gather(*[ingest_one(name) for name in subreddits or self.subreddits])
+        finally:
+            merger.cancel()
+            # Final merge so the run's rows are in mention when it returns
+            await self.merge_staged_mentions()
+        total_mentions = sum(counts)
                 
         logger.info(f"Reddit ingestion complete. Total mentions: {total_mentions}")
         return total_mentions
@@ -212,7 +411,11 @@ class RedditConnector:
 async def main():
     """Main function for testing the Reddit connector"""
     connector = RedditConnector()
-    await connector.ingest_all_subreddits(limit_per_subreddit=25)
+    try:
+        await connector.ingest_all_subreddits(limit_per_subreddit=25)
+    finally:
+        await connector.close()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,8 @@
+-- Keyset pagination indexes for /mentions. Kept out of init.sql so they are
+-- idempotent and can be applied to databases created before they were added
+
+-- Filtered by source, ordered newest first with id as the tie-breaker
+CREATE INDEX IF NOT EXISTS mention_source_created_idx ON mention (source, created_at DESC, id DESC);
+
+-- Unfiltered listing, same ordering
+CREATE INDEX IF NOT EXISTS mention_created_id_idx ON mention (created_at DESC, id DESC);
@@ -13,7 +13,7 @@ fi
 
 # Start the API server
 echo "🔥 Starting FastAPI server..."
-cd api && python -m uvicorn main:app --host 0.0.0.0 --port 8000 --reload &
+cd api && PYTHONPATH=.. python -m uvicorn main:app --host 0.0.0.0 --port 8000 --reload &
 API_PID=$!
 
 # Wait a moment for API to start
@@ -5,135 +5,310 @@ This script tests the Reddit integration without requiring API keys
 """
 
 import asyncio
+import concurrent.futures
+import importlib.util
+import multiprocessing
 import os
 import sys
 from datetime import datetime, timezone
+from enum import IntEnum
+from operator import attrgetter
+from urllib.parse import parse_qsl, urlencode, urlsplit
 
-# Add api and ingest to path
-sys.path.append('./api')
-sys.path.append('./ingest')
+_FIXED_DT = datetime(2024, 1, 1, tzinfo=timezone.utc)
 
-async def test_database_connection():
+# Add api and ingest to the front of the path, once (worker processes
+# re-import this module)
+for path in ('./ingest', './api'):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+def missing_modules(*names):
+    """Return the names that cannot be imported, without importing anything"""
+    return [name for name in names if importlib.util.find_spec(name) is None]
+
+# Third-party dependencies each test needs; tests whose dependencies are not
+# installed are skipped instead of failed
+ASYNCPG_MISSING = missing_modules("asyncpg")
+CONNECTOR_MISSING = missing_modules("asyncpg", "asyncpraw", "redis", "orjson")
+API_MISSING = CONNECTOR_MISSING + missing_modules("fastapi", "sqlalchemy", "pgvector")
+
+# Import everything under test once, up front, so no test blocks the event
+# loop on a first-time import while the others are waiting to run.
+# Import errors are kept and reported by the tests that need the module.
+if not ASYNCPG_MISSING:
+    import asyncpg
+
+connector_import_error = None
+if not CONNECTOR_MISSING:
+    try:
+        from reddit_connector import RedditConnector, RedditMention
+    except Exception as e:
+        connector_import_error = e
+
+app_import_error = None
+if not API_MISSING:
+    try:
+        from main import app
+    except Exception as e:
+        app_import_error = e
+
+class Status(IntEnum):
+    """Outcome returned by each test"""
+    FAIL = 0
+    PASS = 1
+    SKIP = 2
+
+def skip(log, missing):
+    """Report a skipped test"""
+    log.append(f"⏭️  Skipped, missing modules: {', '.join(missing)}")
+    return Status.SKIP
+
+def check_routes(route_paths: frozenset[str], expected: list[str]) -> list[str]:
+    """Return the expected route paths that are not registered"""
+    return [route for route in expected if route not in route_paths]
+
+def write_log(log):
+    """Write a test's collected output in one call, so tests running
+    concurrently don't interleave their lines"""
+    sys.stdout.write("\n".join(log) + "\n")
+    sys.stdout.flush()
+
+PG_SOCKET_DIR = "/var/run/postgresql"
+
+def prefer_unix_socket(dsn):
+    """Point a localhost DSN at the local Postgres Unix socket when one exists"""
+    parts = urlsplit(dsn)
+    port = parts.port or 5432
+    if parts.hostname not in ("localhost", "127.0.0.1"):
+        return dsn
+    if not os.path.exists(os.path.join(PG_SOCKET_DIR, f".s.PGSQL.{port}")):
+        return dsn
+    
+    # Keep credentials, drop host:port, pass socket dir and port as query params
+    userinfo = parts.netloc.rpartition("@")[0]
+    netloc = f"{userinfo}@" if userinfo else ""
+    query = parse_qsl(parts.query) + [("host", PG_SOCKET_DIR), ("port", str(port))]
+    return f"{parts.scheme}://{netloc}{parts.path}?{urlencode(query)}"
+
+async def create_test_pool():
+    """Create the connection pool shared by database tests.
+    
+    Returns (pool, messages): pool is None if unavailable, and messages
+    explain fallbacks and failures for the database test's log.
+    """
+    messages = []
+    if ASYNCPG_MISSING:
+        return None, messages
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if not DATABASE_URL:
+        return None, ["❌ Database pool not available: DATABASE_URL is not set"]
+    
+    pool_options = dict(min_size=1, max_size=4, statement_cache_size=1024)
+    socket_dsn = prefer_unix_socket(DATABASE_URL)
+    if socket_dsn != DATABASE_URL:
+        # Socket logins go through pg_hba's "local" rules (often peer auth),
+        # so a DSN written for TCP may be refused there
+        try:
+            return await asyncpg.create_pool(socket_dsn, **pool_options), messages
+        except Exception as e:
+            messages.append(f"⚠️  Unix socket connection failed, retrying over TCP: {e}")
+    try:
+        return await asyncpg.create_pool(DATABASE_URL, **pool_options), messages
+    except Exception as e:
+        messages.append(f"❌ Could not create database pool: {e}")
+        return None, messages
+
+async def test_database_connection(pool, pool_messages):
     """Test basic database connectivity"""
-    print("Testing database connection...")
+    log = ["Testing database connection..."]
     try:
-        import asyncpg
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        if not DATABASE_URL:
-            print("❌ DATABASE_URL not set")
-            return False
+        if ASYNCPG_MISSING:
+            return skip(log, ASYNCPG_MISSING)
+        try:
+            # Pool creation problems are reported here, in this test's output
+            log.extend(pool_messages)
+            if pool is None:
+                return Status.FAIL
             
-        conn = await asyncpg.connect(DATABASE_URL)
-        result = await conn.fetchval("SELECT COUNT(*) FROM mention")
-        await conn.close()
-        print(f"✅ Database connected. Current mentions: {result}")
-        return True
-    except Exception as e:
-        print(f"❌ Database connection failed: {e}")
-        return False
+            # Planner estimate from the catalog: proves the table exists without
+            # the full scan COUNT(*) would need
+            async with pool.acquire() as conn:
+                result = await conn.fetchval(
+                    "SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE relname = $1", "mention"
+                )
+            if result is None:
+                log.append("❌ Table mention does not exist")
+                return Status.FAIL
+            log.append(f"✅ Database connected. Current mentions (est.): {result}")
+            return Status.PASS
+        except Exception as e:
+            log.append(f"❌ Database connection failed: {e}")
+            return Status.FAIL
+    finally:
+        write_log(log)
 
 async def test_reddit_connector_structure():
     """Test Reddit connector can be imported and initialized"""
-    print("\nTesting Reddit connector structure...")
+    log = ["\nTesting Reddit connector structure..."]
     try:
-        from reddit_connector import RedditConnector, RedditMention
+        if CONNECTOR_MISSING:
+            return skip(log, CONNECTOR_MISSING)
+        try:
+            if connector_import_error:
+                raise connector_import_error
         
-        # Test RedditMention dataclass
-        mention = RedditMention(
-            source_id="test_123",
-            author="test_user",
-            text="Test $SOL post",
-            created_at=datetime.now(timezone.utc)
-        )
-        print(f"✅ RedditMention created: {mention.source_id}")
+            # Test RedditMention dataclass
+            mention = RedditMention(
+                source_id="test_123",
+                author="test_user",
+                text="Test $SOL post",
+                created_at=_FIXED_DT
+            )
+            log.append(f"✅ RedditMention created: {mention.source_id}")
         
-        # Test RedditConnector initialization (without API keys)
-        print("✅ Reddit connector structure is valid")
-        return True
+            # Test RedditConnector initialization (without API keys)
+            log.append("✅ Reddit connector structure is valid")
+            return Status.PASS
         
-    except Exception as e:
-        print(f"❌ Reddit connector import failed: {e}")
-        return False
+        except Exception as e:
+            log.append(f"❌ Reddit connector import failed: {e}")
+            return Status.FAIL
+    finally:
+        write_log(log)
 
-async def test_entity_extraction():
+def test_entity_extraction():
     """Test entity extraction functionality"""
-    print("\nTesting entity extraction...")
+    log = ["\nTesting entity extraction..."]
     try:
-        from reddit_connector import RedditConnector
+        if CONNECTOR_MISSING:
+            return skip(log, CONNECTOR_MISSING)
+        try:
+            if connector_import_error:
+                raise connector_import_error
         
-        connector = RedditConnector()
+            connector = RedditConnector()
         
-        # Test text with various entities
-        test_text = "Check out $SOL and $WIF tokens! Also u/test_user mentioned https://example.com"
-        entities = connector.extract_entities(test_text)
+            # Test text with various entities
+            test_text = "Check out $SOL and $WIF tokens! Also u/test_user mentioned https://example.com"
+            entities = connector.extract_entities(test_text)
         
-        print(f"Extracted entities: {entities}")
+            log.append(f"Extracted entities: {entities}")
         
-        # Verify expected entities
-        assert "SOL" in entities["tickers"], "SOL ticker not extracted"
-        assert "WIF" in entities["tickers"], "WIF ticker not extracted"
-        assert "test_user" in entities["mentions"], "User mention not extracted"
-        assert "https://example.com" in entities["urls"], "URL not extracted"
+            # Verify expected entities
+            assert "SOL" in entities["tickers"], "SOL ticker not extracted"
+            assert "WIF" in entities["tickers"], "WIF ticker not extracted"
+            assert "test_user" in entities["mentions"], "User mention not extracted"
+            assert "https://example.com" in entities["urls"], "URL not extracted"
+            
+            # Edge cases of the single-pass pattern
+            assert connector.extract_entities("foo$BAR")["tickers"] == ["BAR"], "Ticker inside a word not extracted"
+            assert connector.extract_entities("$SOL's run")["tickers"] == ["SOL"], "Possessive ticker not extracted"
+            url_entities = connector.extract_entities("see https://x.com/$ABC now")
+            assert url_entities["tickers"] == [], "Ticker extracted from inside a URL"
+            assert url_entities["urls"] == ["https://x.com/$ABC"], "URL containing $ not extracted"
+            assert connector.extract_entities("$ABCDEFGHIJK")["tickers"] == [], "11-letter ticker not rejected"
         
-        print("✅ Entity extraction working correctly")
-        return True
+            log.append("✅ Entity extraction working correctly")
+            return Status.PASS
         
-    except Exception as e:
-        print(f"❌ Entity extraction failed: {e}")
-        return False
+        except Exception as e:
+            log.append(f"❌ Entity extraction failed: {e}")
+            return Status.FAIL
+    finally:
+        write_log(log)
 
-async def test_api_routes():
+def test_api_routes():
     """Test that API routes are properly configured"""
-    print("\nTesting API route configuration...")
+    log = ["\nTesting API route configuration..."]
     try:
-        # Import main app
-        sys.path.append('./api')
-        from main import app
+        if API_MISSING:
+            return skip(log, API_MISSING)
+        try:
+            if app_import_error:
+                raise app_import_error
         
-        # Check that ingestion router is included
-        routes = [route.path for route in app.routes]
+            # Check that ingestion router is included (route paths are canonical,
+            # so exact set membership is enough)
+            route_paths = frozenset(map(attrgetter('path'), app.routes))
         
-        expected_routes = ["/ingest/reddit", "/ingest/status", "/mentions", "/healthz"]
+            expected_routes = ["/ingest/reddit", "/ingest/status", "/mentions", "/healthz"]
         
-        for route in expected_routes:
-            if any(route in r for r in routes):
-                print(f"✅ Route {route} found")
-            else:
-                print(f"❌ Route {route} missing")
-                return False
+            missing = check_routes(route_paths, expected_routes)
+            if missing:
+                log.append(f"❌ Routes missing: {', '.join(missing)}")
+                return Status.FAIL
                 
-        print("✅ All expected API routes are configured")
-        return True
+            log.append("✅ All expected API routes are configured")
+            return Status.PASS
         
-    except Exception as e:
-        print(f"❌ API route test failed: {e}")
-        return False
+        except Exception as e:
+            log.append(f"❌ API route test failed: {e}")
+            return Status.FAIL
+    finally:
+        write_log(log)
+
+def run_in_fresh_loop(test):
+    """Run a test in a worker process; coroutine tests get their own event loop"""
+    if asyncio.iscoroutinefunction(test):
+        return asyncio.run(test())
+    return test()
+
+# Tests without shared state, each run in its own worker process
+PROCESS_TESTS = [
+    test_reddit_connector_structure,
+    test_entity_extraction,
+    test_api_routes
+]
 
 async def main():
     """Run all tests"""
     print("🚀 Starting Reddit Connector Tests\n")
     
-    tests = [
-        test_database_connection(),
-        test_reddit_connector_structure(),
-        test_entity_extraction(),
-        test_api_routes()
-    ]
-    
-    results = await asyncio.gather(*tests, return_exceptions=True)
+    pool, pool_messages = await create_test_pool()
+    loop = asyncio.get_running_loop()
+    workers = min(len(PROCESS_TESTS), os.cpu_count() or 1)
+    try:
+        # Independent tests run in parallel worker processes, free of the GIL;
+        # the database test needs the shared pool, so it stays on this loop.
+        # Spawned workers import the modules afresh instead of inheriting this
+        # process's imports, event loop and open pool sockets through fork
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            tests = [test_database_connection(pool, pool_messages)] + [
+                loop.run_in_executor(executor, run_in_fresh_loop, test)
+                for test in PROCESS_TESTS
+            ]
+            
+            results = await asyncio.gather(*tests, return_exceptions=True)
+    finally:
+        if pool is not None:
+            await pool.close()
     
-    passed = sum(1 for r in results if r is True)
+    # Exceptions from gather count as neither passed nor skipped
+    passed = results.count(Status.PASS)
+    skipped = results.count(Status.SKIP)
     total = len(results)
     
-    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+    print(f"\n📊 Test Results: {passed}/{total} tests passed, {skipped} skipped")
     
     if passed == total:
         print("🎉 All tests passed! Reddit connector is ready.")
         return True
+    elif passed + skipped == total:
+        print("✅ No failures, but some tests were skipped. Install the missing modules to run them.")
+        return True
     else:
         print("⚠️  Some tests failed. Check the output above.")
         return False
 
 if __name__ == "__main__":
+    # Use uvloop's faster event loop when it is installed
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     success = asyncio.run(main())
     sys.exit(0 if success else 1)
\ No newline at end of file